@@ -0,0 +1,5 @@
+import sys
+from pathlib import Path
+
+# ups_utils.py lives at the repo root, not in a package
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
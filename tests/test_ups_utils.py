@@ -0,0 +1,136 @@
+from datetime import date
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from ups_utils import (
+    blank_whitespace_cells,
+    bucket_days,
+    bucket_due,
+    days_until,
+    suppress_battery_mask,
+    to_date,
+    write_bucket,
+)
+
+
+@pytest.mark.parametrize("fmt", ["parquet", "feather"])
+def test_write_bucket_arrow_formats_handle_mixed_type_columns(tmp_path, fmt):
+    pytest.importorskip("pyarrow")
+    df = pd.DataFrame(
+        {
+            "Contact": pd.Categorical(["NOC", "NOC", "NOC"], categories=["Jane Roe", "NOC"]),
+            "UPS Location and Hostname": [12345, "BLDG1 MDF ups1", None],
+            "Unit Serial #": ["S1", 987, 1.5],
+        },
+        index=[7, 3, 9],
+    )
+    cols = ["Contact", "UPS Location and Hostname", "Unit Serial #"]
+    out_path = tmp_path / f"overdue.{fmt}"
+
+    write_bucket(df, out_path, cols, fmt=fmt)
+
+    back = pd.read_parquet(out_path) if fmt == "parquet" else pd.read_feather(out_path)
+    assert list(back.columns) == cols
+    # no category dictionary leaking other contacts' names
+    assert not isinstance(back["Contact"].dtype, pd.CategoricalDtype)
+    assert back["Contact"].tolist() == ["NOC", "NOC", "NOC"]
+    assert back["UPS Location and Hostname"].tolist()[:2] == ["12345", "BLDG1 MDF ups1"]
+    assert pd.isna(back["UPS Location and Hostname"].iloc[2])
+    assert back["Unit Serial #"].tolist() == ["S1", "987", "1.5"]
+
+
+@pytest.mark.parametrize(
+    "values, expected",
+    [
+        # ISO "Z" timestamps mixed with Smartsheet M/D/YYYY (retry comes back tz-aware)
+        (["2026-01-05T10:00:00Z", "1/6/2026"], ["2026-01-05", "2026-01-06"]),
+        # nanosecond precision in the retried values
+        (["2026-01-05 10:00:00.123456789", "1/6/2026"], ["2026-01-05", "2026-01-06"]),
+        (["1/6/2026", None, "garbage"], ["2026-01-06", None, None]),
+        # different UTC offsets among the retried values
+        (
+            ["1/6/2026", "2026-01-05T10:00:00+01:00", "2026-01-05T10:00:00-05:00"],
+            ["2026-01-06", "2026-01-05", "2026-01-05"],
+        ),
+    ],
+)
+def test_to_date_mixed_string_inputs(values, expected):
+    out = to_date(pd.Series(values, dtype=object))
+    assert out.dt.tz is None
+    assert out.tolist() == [pd.Timestamp(v) if v else pd.NaT for v in expected]
+
+
+def test_to_date_numeric_column_matches_to_datetime():
+    s = pd.Series([1_767_600_000_000_000_000, None])
+    assert to_date(s).tolist() == pd.to_datetime(s, errors="coerce").dt.normalize().tolist()
+
+
+def test_blank_whitespace_cells_matches_calamine():
+    df = pd.DataFrame({"Battery Type": [" ", "RBC7", None, "  y "], "n": [1, 2, 3, 4]}, dtype=object)
+    out = blank_whitespace_cells(df)
+    assert out["Battery Type"].isna().tolist() == [True, False, True, False]
+    assert out["Battery Type"].iloc[3] == "  y "
+    assert out["n"].tolist() == [1, 2, 3, 4]
+
+
+def test_days_until_handles_dates_past_ns_range():
+    due = to_date(pd.Series(["12/31/9999", "1/1/2300", None, "1/5/2026"], dtype=object))
+    days = days_until(due, pd.Timestamp("2026-01-01"))
+    assert days[0] == (date(9999, 12, 31) - date(2026, 1, 1)).days
+    assert days[1] == (date(2300, 1, 1) - date(2026, 1, 1)).days
+    assert np.isnan(days[2])
+    assert days[3] == 4
+
+
+# Run dates on and around the fiscal (June 30 / July 1) and calendar (Dec 31) boundaries
+PARITY_TODAYS = [
+    "2026-01-01",
+    "2026-03-15",
+    "2026-06-29",
+    "2026-06-30",
+    "2026-07-01",
+    "2026-07-02",
+    "2026-10-15",
+    "2026-12-30",
+    "2026-12-31",
+    "2027-01-01",
+]
+
+
+def _due_dates(today: pd.Timestamp) -> pd.Series:
+    # Every day from just before today through past both next year-ends,
+    # plus a missing date and one beyond the datetime64[ns] range
+    days = pd.date_range(today - pd.Timedelta(days=5), today + pd.Timedelta(days=560)).strftime("%m/%d/%Y")
+    return to_date(pd.Series([*days, None, "12/31/9999"], dtype=object))
+
+
+@pytest.mark.parametrize("today", PARITY_TODAYS)
+def test_bucket_days_matches_bucket_due(today):
+    today = pd.Timestamp(today)
+    due = _due_dates(today)
+
+    got = pd.Series(bucket_days(days_until(due, today), today)).astype(object).fillna("NO_DATE")
+    expected = due.apply(lambda d: bucket_due(d, today))
+
+    assert got.tolist() == expected.tolist()
+
+
+@pytest.mark.parametrize("today", PARITY_TODAYS)
+def test_suppress_battery_mask_matches_series_rules(today):
+    today = pd.Timestamp(today)
+    due = _due_dates(today)
+    rng = np.random.default_rng(0)
+    battery = due.iloc[rng.integers(0, len(due), 2000)].reset_index(drop=True)
+    unit = due.iloc[rng.integers(0, len(due), 2000)].reset_index(drop=True)
+
+    # The rules as originally written on datetime Series
+    both_dates_present = battery.notna() & unit.notna()
+    within_year = (unit - battery).abs().dt.days <= 365
+    both_overdue = (battery < today) & (unit < today)
+    expected = (both_dates_present & within_year) | both_overdue
+
+    got = suppress_battery_mask(days_until(battery, today), days_until(unit, today))
+
+    assert got.tolist() == expected.tolist()
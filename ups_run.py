@@ -1,17 +1,27 @@
 import argparse
+import io
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 from datetime import datetime
+import numpy as np
 import pandas as pd
 
 from ups_utils import (
+    build_norm_map,
     find_col,
+    read_csv_fast,
+    read_excel_fast,
     safe_name,
     to_date,
-    bucket_due,              # CHANGED
-    write_bucket_csv,
+    BUCKET_ORDER,
+    CSV_WRITE_WORKERS,
+    HAS_PYARROW,
+    bucket_days,
+    days_until,
+    OUT_FORMATS,
+    write_bucket,
     not_blank,
-    classify_idf_mdf,
-    is_noc_contact,
+    suppress_battery_mask,
     format_counts,
     list_overdue_locations,
 )
@@ -19,11 +29,19 @@ from ups_utils import (
 
 def main():
     ap = argparse.ArgumentParser(
-        description="Split Smartsheet UPS export by Contact into Battery/Unit buckets (CSV)."
+        description="Split Smartsheet UPS export by Contact into Battery/Unit buckets (CSV, Parquet or Feather)."
     )
     ap.add_argument("input", help="Path to Smartsheet export (.xlsx or .csv)")
     ap.add_argument("--outdir", default="out", help="Output directory root (default: out)")
+    ap.add_argument(
+        "--out-format",
+        choices=OUT_FORMATS,
+        default="csv",
+        help="Per-contact bucket file format (default: csv; parquet/feather need pyarrow)",
+    )
     args = ap.parse_args()
+    if args.out_format != "csv" and not HAS_PYARROW:
+        ap.error(f"--out-format {args.out_format} needs pyarrow (pip install pyarrow)")
 
     in_path = Path(args.input)
     if not in_path.exists():
@@ -31,22 +49,23 @@ def main():
 
     # Load
     if in_path.suffix.lower() in [".xlsx", ".xls"]:
-        df = pd.read_excel(in_path)
+        df = read_excel_fast(in_path)
     elif in_path.suffix.lower() == ".csv":
-        df = pd.read_csv(in_path)
+        df = read_csv_fast(in_path)
     else:
         raise SystemExit("Unsupported input. Use .xlsx/.xls or .csv")
 
     # Columns
-    contact_col = find_col(df, ["Contact"])
-    loc_col = find_col(df, ["UPS Location and Hostname", "UPS Location & Hostname", "Location and Hostname"])
-    ip_col = find_col(df, ["IP Address", "IP"])
-    mac_col = find_col(df, ["MAC Address", "MAC"])
-    battery_type_col = find_col(df, ["Battery Type", "Battery Model"])
-    battery_due_col = find_col(df, ["Next Battery Replacement Date", "Next Battery Replacement"])
-    unit_model_col = find_col(df, ["Unit Model"])
-    unit_serial_col = find_col(df, ["Unit Serial #", "Unit Serial", "Serial #", "Serial"])
-    unit_due_col = find_col(df, ["Unit replacement Date", "Unit Replacement Date", "Replacement Date"])
+    norm_map = build_norm_map(df)
+    contact_col = find_col(df, ["Contact"], norm_map)
+    loc_col = find_col(df, ["UPS Location and Hostname", "UPS Location & Hostname", "Location and Hostname"], norm_map)
+    ip_col = find_col(df, ["IP Address", "IP"], norm_map)
+    mac_col = find_col(df, ["MAC Address", "MAC"], norm_map)
+    battery_type_col = find_col(df, ["Battery Type", "Battery Model"], norm_map)
+    battery_due_col = find_col(df, ["Next Battery Replacement Date", "Next Battery Replacement"], norm_map)
+    unit_model_col = find_col(df, ["Unit Model"], norm_map)
+    unit_serial_col = find_col(df, ["Unit Serial #", "Unit Serial", "Serial #", "Serial"], norm_map)
+    unit_due_col = find_col(df, ["Unit replacement Date", "Unit Replacement Date", "Replacement Date"], norm_map)
 
     missing = []
     for name, col in [
@@ -79,19 +98,26 @@ def main():
             identifier_masks.append(not_blank(df[c]))
 
     if identifier_masks:
-        has_identifier = identifier_masks[0]
-        for m in identifier_masks[1:]:
-            has_identifier = has_identifier | m
+        has_identifier = np.logical_or.reduce([m.to_numpy() for m in identifier_masks])
     else:
-        has_identifier = pd.Series([True] * len(df), index=df.index)
+        has_identifier = np.ones(len(df), dtype=bool)
 
     before = len(df)
     df = df[has_identifier].copy()
     after = len(df)
     print(f"Filtered out {before - after} non-unit header rows")
 
+    # Categorical contact: groupby hashes int codes instead of strings
+    df[contact_col] = df[contact_col].astype("category")
+
     # Closet classification
-    df["closet_type"] = df[loc_col].apply(classify_idf_mdf)
+    loc_upper = df[loc_col].astype("string").str.upper()
+    is_mdf = loc_upper.str.contains("MDF", regex=False, na=False)
+    is_idf = loc_upper.str.contains("IDF", regex=False, na=False) & ~is_mdf
+    df["closet_type"] = pd.Categorical(
+        np.where(is_mdf, "MDF", np.where(is_idf, "IDF", "UNKNOWN")),
+        categories=["MDF", "IDF", "UNKNOWN"],
+    )
 
     # Parse dates
     df[battery_due_col] = to_date(df[battery_due_col])
@@ -100,39 +126,29 @@ def main():
     # -------------------------
     # CHANGED: new bucket labels
     # -------------------------
-    df["battery_bucket"] = df[battery_due_col].apply(lambda d: bucket_due(d, today))
-    df["unit_bucket"] = df[unit_due_col].apply(lambda d: bucket_due(d, today))
-
-    logical_order = [
-        "BY_CALENDAR_YEAR_END",
-        "BY_FISCAL_YEAR_END",
-        "BEYOND_YEAR_ENDS",
-        "OVERDUE",
-    ]
-    df["battery_bucket"] = pd.Categorical(df["battery_bucket"], categories=logical_order, ordered=True)
-    df["unit_bucket"] = pd.Categorical(df["unit_bucket"], categories=logical_order, ordered=True)
+    # One datetime pass per column; bucketing and both rules reuse these day offsets
+    battery_days = days_until(df[battery_due_col], today)
+    unit_days = days_until(df[unit_due_col], today)
+
+    logical_order = BUCKET_ORDER
+    df["battery_bucket"] = bucket_days(battery_days, today)
+    df["unit_bucket"] = bucket_days(unit_days, today)
 
     # ---------------
     # IMPORTANT RULES
     # ---------------
-    # Rule 1: If battery due and unit due are within 365 days of each other,
-    #         prefer replacing the unit.
-    both_dates_present = df[battery_due_col].notna() & df[unit_due_col].notna()
-    within_year = (df[unit_due_col] - df[battery_due_col]).abs().dt.days <= 365
-    prefer_unit_due_to_proximity = both_dates_present & within_year
-
-    # Rule 2: If BOTH are overdue, only log unit (CHANGED: no more *_days columns)
-    both_overdue = (df[battery_due_col] < today) & (df[unit_due_col] < today)
-
-    # Final: suppress battery logging if either rule applies
-    df["suppress_battery"] = prefer_unit_due_to_proximity | both_overdue
+    # Rule 1: unit and battery due within 365 days of each other -> prefer the unit.
+    # Rule 2: both overdue -> only log the unit.
+    # Suppress battery logging if either applies (kept as a local array; only
+    # columns read after the split are attached to df).
+    suppress_battery = suppress_battery_mask(battery_days, unit_days)
 
     # Mark NOC rows BEFORE creating df_battery_effective
-    df["is_noc"] = df[contact_col].apply(is_noc_contact)
+    df["is_noc"] = df[contact_col].astype("string").str.contains("noc", case=False, regex=False, na=False)
 
-    # Battery dataset after suppression rules
-    df_battery_effective = df[~df["suppress_battery"]].copy()
-    df_battery_effective = df_battery_effective[df_battery_effective[battery_due_col].notna()].copy()
+    # Battery dataset after suppression rules: one combined mask, one selection.
+    # Boolean indexing already returns a new frame and nothing below mutates it.
+    df_battery_effective = df[~suppress_battery & ~np.isnan(battery_days)]
 
     # Output base
     stamp = datetime.now().strftime("%m-%d-%Y")
@@ -147,27 +163,45 @@ def main():
     if unit_serial_col:
         unit_out_cols.insert(3, unit_serial_col)
 
-    # We iterate over the logical order so files are generated in a consistent loop
-    bucket_list = logical_order
-
-    # Split by Contact
-    for contact, g_all in df.groupby(contact_col, dropna=False):
-        contact_folder = out_root / "by_contact" / safe_name(contact)
-
-        # Batteries (RESPECT suppression rules)
-        g_bat = df_battery_effective[df_battery_effective[contact_col] == contact]
-        bat_folder = contact_folder / "batteries"
-        for b in bucket_list:
-            subset = g_bat[g_bat["battery_bucket"] == b].copy()
-            if len(subset) > 0:
-                write_bucket_csv(subset, bat_folder / f"{b.lower()}.csv", battery_out_cols)
+    # Split by Contact: one hash pass per dataset over (contact, bucket)
+    by_contact = out_root / "by_contact"
+    # safe_name() isn't injective ("Bob O'Neil" and "Bob ONeil" -> Bob_ONeil), and
+    # "Bob"/"BOB" are one folder on case-insensitive filesystems (macOS, Windows).
+    # Contacts that collide either way share a single folder Path.
+    folders_by_key = {}
+    contact_folders = {}
+    for c in df[contact_col].unique():
+        folder = by_contact / safe_name(c)
+        contact_folders[c] = folders_by_key.setdefault(str(folder).casefold(), folder)
+
+    # Batteries (RESPECT suppression rules); units are always written
+    # Narrow to output columns + group keys before splitting
+    bat_out = df_battery_effective[battery_out_cols + ["battery_bucket"]]
+    unit_out = df[unit_out_cols + ["unit_bucket"]]
+    bat_groups = bat_out.groupby([contact_col, "battery_bucket"], observed=True, sort=False)
+    unit_groups = unit_out.groupby([contact_col, "unit_bucket"], observed=True, sort=False)
+
+    # One mkdir per output folder instead of one per file
+    for groups, kind in [(bat_groups, "batteries"), (unit_groups, "units")]:
+        for contact in {c for c, _ in groups.groups}:
+            (contact_folders[contact] / kind).mkdir(parents=True, exist_ok=True)
+
+    # Subsets of colliding contacts land on the same file; merge them into one
+    # task so no two workers ever write the same path.
+    ext = args.out_format
+    outputs = {}
+    for groups, kind, cols in [(bat_groups, "batteries", battery_out_cols), (unit_groups, "units", unit_out_cols)]:
+        for (contact, b), subset in groups:
+            out_path = contact_folders[contact] / kind / f"{b.lower()}.{ext}"
+            outputs.setdefault(out_path, (cols, []))[1].append(subset)
+    tasks = [
+        (subsets[0] if len(subsets) == 1 else pd.concat(subsets), out_path, cols)
+        for out_path, (cols, subsets) in outputs.items()
+    ]
 
-        # Units (always written)
-        unit_folder = contact_folder / "units"
-        for b in bucket_list:
-            subset = g_all[g_all["unit_bucket"] == b].copy()
-            if len(subset) > 0:
-                write_bucket_csv(subset, unit_folder / f"{b.lower()}.csv", unit_out_cols)
+    # Small files, mostly I/O: overlap the writes. list() surfaces any write error.
+    with ThreadPoolExecutor(max_workers=CSV_WRITE_WORKERS) as pool:
+        list(pool.map(lambda t: write_bucket(*t, fmt=args.out_format), tasks))
 
     # -------------------------
     # Summary: NOC-focused MDF split OVERDUE location lists ONLY
@@ -176,78 +210,90 @@ def main():
     noc_bat = df_battery_effective[df_battery_effective["is_noc"]].copy()
     other_df = df[~df["is_noc"]].copy()
 
-    summary_lines = []
-    summary_lines.append(f"Run date: {today.date()}")
-    summary_lines.append(f"Input: {in_path}")
-    summary_lines.append("")
+    summary = io.StringIO()
+    summary.write(f"Run date: {today.date()}\n")
+    summary.write(f"Input: {in_path}\n")
+    summary.write("\n")
 
     # Overall counts
-    summary_lines.append("=== OVERALL COUNTS (ALL CONTACTS) ===")
+    summary.write("=== OVERALL COUNTS (ALL CONTACTS) ===\n")
 
-    summary_lines.append(
+    summary.write(
         format_counts(
             "Battery buckets",
             df_battery_effective["battery_bucket"].value_counts(sort=False, dropna=True),
         )
+        + "\n"
     )
-    summary_lines.append("")
-    summary_lines.append(format_counts("Unit buckets", df["unit_bucket"].value_counts(sort=False, dropna=True)))
-    summary_lines.append("")
-    summary_lines.append(f"Battery rows suppressed: {int(df['suppress_battery'].sum())}")
-    summary_lines.append("")
+    summary.write("\n")
+    summary.write(format_counts("Unit buckets", df["unit_bucket"].value_counts(sort=False, dropna=True)) + "\n")
+    summary.write("\n")
+    summary.write(f"Battery rows suppressed: {int(suppress_battery.sum())}\n")
+    summary.write("\n")
 
     # NOC section
-    summary_lines.append("=== NOC ONLY ===")
+    summary.write("=== NOC ONLY ===\n")
     if len(noc_all) == 0:
-        summary_lines.append("No rows detected as NOC (Contact did not contain 'noc').")
-        summary_lines.append("If your NOC contact string is different, adjust is_noc_contact().")
-        summary_lines.append("")
+        summary.write("No rows detected as NOC (Contact did not contain 'noc').\n")
+        summary.write("If your NOC contact string is different, adjust the is_noc check in ups_run.py.\n")
+        summary.write("\n")
     else:
-        summary_lines.append("NOC Battery buckets by MDF/IDF:")
-        pivot_bat = pd.crosstab(noc_bat["closet_type"], noc_bat["battery_bucket"])
-        summary_lines.append(pivot_bat.to_string())
-        summary_lines.append("")
-
-        summary_lines.append("NOC Unit buckets by MDF/IDF:")
-        pivot_unit = pd.crosstab(noc_all["closet_type"], noc_all["unit_bucket"])
-        summary_lines.append(pivot_unit.to_string())
-        summary_lines.append("")
+        summary.write("NOC Battery buckets by MDF/IDF:\n")
+        pivot_bat = (
+            noc_bat.groupby(["closet_type", "battery_bucket"], observed=True)
+            .size()
+            .unstack(fill_value=0)
+            .reindex(columns=logical_order, fill_value=0)
+        )
+        summary.write(pivot_bat.to_string() + "\n")
+        summary.write("\n")
+
+        summary.write("NOC Unit buckets by MDF/IDF:\n")
+        pivot_unit = (
+            noc_all.groupby(["closet_type", "unit_bucket"], observed=True)
+            .size()
+            .unstack(fill_value=0)
+            .reindex(columns=logical_order, fill_value=0)
+        )
+        summary.write(pivot_unit.to_string() + "\n")
+        summary.write("\n")
 
         # Overdue counts
         noc_bat_overdue = noc_bat[noc_bat["battery_bucket"] == "OVERDUE"]
         noc_unit_overdue = noc_all[noc_all["unit_bucket"] == "OVERDUE"]
-        summary_lines.append(f"NOC Batteries OVERDUE: {len(noc_bat_overdue)}")
-        summary_lines.append(f"NOC Units OVERDUE: {len(noc_unit_overdue)}")
-        summary_lines.append("")
+        summary.write(f"NOC Batteries OVERDUE: {len(noc_bat_overdue)}\n")
+        summary.write(f"NOC Units OVERDUE: {len(noc_unit_overdue)}\n")
+        summary.write("\n")
 
         # OVERDUE location lists ONLY
-        list_overdue_locations(summary_lines, noc_bat_overdue, loc_col, "NOC Battery OVERDUE locations")
-        summary_lines.append("")
-        list_overdue_locations(summary_lines, noc_unit_overdue, loc_col, "NOC Unit OVERDUE locations")
-        summary_lines.append("")
+        list_overdue_locations(summary, noc_bat_overdue, loc_col, "NOC Battery OVERDUE locations")
+        summary.write("\n")
+        list_overdue_locations(summary, noc_unit_overdue, loc_col, "NOC Unit OVERDUE locations")
+        summary.write("\n")
 
     # Other contacts
-    summary_lines.append("=== OTHER CONTACTS ===")
+    summary.write("=== OTHER CONTACTS ===\n")
     if len(other_df) == 0:
-        summary_lines.append("None (all rows are NOC or UNASSIGNED).")
+        summary.write("None (all rows are NOC or UNASSIGNED).\n")
     else:
         actionable_other = other_df[
             other_df["battery_bucket"].isin(["OVERDUE", "BY_FISCAL_YEAR_END", "BY_CALENDAR_YEAR_END"])
             | other_df["unit_bucket"].isin(["OVERDUE", "BY_FISCAL_YEAR_END", "BY_CALENDAR_YEAR_END"])
         ]
         if len(actionable_other) == 0:
-            summary_lines.append("No actionable items for non-NOC contacts (everything is beyond year-ends).")
+            summary.write("No actionable items for non-NOC contacts (everything is beyond year-ends).\n")
         else:
             counts = actionable_other[contact_col].value_counts(dropna=True)
-            summary_lines.append("Actionable rows by Contact (overdue or due by fiscal/calendar year end):")
-            summary_lines.append(counts.to_string())
+            counts = counts[counts > 0]
+            summary.write("Actionable rows by Contact (overdue or due by fiscal/calendar year end):\n")
+            summary.write(counts.to_string() + "\n")
 
-    (out_root / "summary.txt").write_text("\n".join(summary_lines), encoding="utf-8")
+    (out_root / "summary.txt").write_text(summary.getvalue(), encoding="utf-8")
 
     print("\nDone ✅")
     print(f"Output folder:\n{out_root.resolve()}")
     print("\nExample path:")
-    print(out_root / "by_contact" / "UNASSIGNED" / "batteries" / "overdue.csv")
+    print(out_root / "by_contact" / "UNASSIGNED" / "batteries" / f"overdue.{args.out_format}")
 
 
 if __name__ == "__main__":
@@ -1,15 +1,36 @@
 # ups_utils.py
 from pathlib import Path
 import re
+from typing import TextIO
+import numpy as np
 import pandas as pd
 
+try:
+    import pyarrow  # noqa: F401
+
+    HAS_PYARROW = True
+except ImportError:
+    HAS_PYARROW = False
+
+_STRING_DTYPE = "string[pyarrow]" if HAS_PYARROW else "string"
+
+_NORM_RE = re.compile(r"[^a-z0-9]+")
+_WS_RE = re.compile(r"\s+")
+_SAFE_RE = re.compile(r"[^A-Za-z0-9_\-]+")
+
 
 def normalize(s: str) -> str:
-    return re.sub(r"[^a-z0-9]+", "", str(s).strip().lower())
+    return _NORM_RE.sub("", str(s).strip().lower())
+
 
+def build_norm_map(df: pd.DataFrame) -> dict[str, str]:
+    return {normalize(c): c for c in df.columns}
 
-def find_col(df: pd.DataFrame, candidates: list[str]) -> str | None:
-    norm_map = {normalize(c): c for c in df.columns}
+
+def find_col(df: pd.DataFrame, candidates: list[str], norm_map: dict[str, str] | None = None) -> str | None:
+    # Pass a prebuilt norm_map when looking up several columns on the same frame
+    if norm_map is None:
+        norm_map = build_norm_map(df)
     for cand in candidates:
         key = normalize(cand)
         if key in norm_map:
@@ -17,17 +38,67 @@ def find_col(df: pd.DataFrame, candidates: list[str]) -> str | None:
     return None
 
 
+def read_csv_fast(path: Path) -> pd.DataFrame:
+    # pyarrow's multithreaded parser; falls back to the default engine if
+    # pyarrow isn't installed or rejects the file
+    try:
+        return pd.read_csv(path, engine="pyarrow")
+    except (ImportError, ValueError):
+        return pd.read_csv(path)
+
+
+def read_excel_fast(path: Path) -> pd.DataFrame:
+    # calamine (Rust) reader; falls back to openpyxl/xlrd if python-calamine isn't installed
+    try:
+        df = pd.read_excel(path, engine="calamine")
+    except (ImportError, ValueError):
+        df = pd.read_excel(path)
+    return blank_whitespace_cells(df)
+
+
+def blank_whitespace_cells(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    calamine reads whitespace-only cells as missing while openpyxl keeps " ".
+    Treat them as missing for every engine so the output doesn't depend on which one ran.
+    """
+    for c in df.columns:
+        s = df[c]
+        if s.dtype == object or isinstance(s.dtype, pd.StringDtype):
+            blank = s.astype(_STRING_DTYPE).str.strip().eq("").fillna(False).to_numpy(dtype=bool)
+            if blank.any():
+                df[c] = s.mask(blank)
+    return df
+
+
 def safe_name(x) -> str:
     s = str(x).strip()
     if not s or s.lower() == "nan":
         return "UNASSIGNED"
-    s = re.sub(r"\s+", "_", s)
-    s = re.sub(r"[^A-Za-z0-9_\-]+", "", s)
+    s = _WS_RE.sub("_", s)
+    s = _SAFE_RE.sub("", s)
     return s or "UNASSIGNED"
 
 
+SMARTSHEET_DATE_FORMAT = "%m/%d/%Y"
+
+
 def to_date(series: pd.Series) -> pd.Series:
-    return pd.to_datetime(series, errors="coerce").dt.normalize()
+    if not (series.dtype == object or isinstance(series.dtype, pd.StringDtype)):
+        # Already datetime, numeric, etc.: nothing for the format-first path to speed up
+        return pd.to_datetime(series, errors="coerce").dt.normalize()
+    # Fast C path for the usual Smartsheet format; anything it can't read
+    # (other layouts, Excel datetimes mixed with text) gets a per-element retry.
+    parsed = pd.to_datetime(series, errors="coerce", format=SMARTSHEET_DATE_FORMAT, cache=True)
+    retry = parsed.isna() & series.notna()
+    if retry.any():
+        # utc=True so values with different UTC offsets don't raise "Mixed timezones";
+        # offset-bearing values land on their UTC date, naive ones are unchanged.
+        # Note "mixed" also reads day-first strings like 13/01/2026 (as Jan 13).
+        retried = pd.to_datetime(series[retry], errors="coerce", format="mixed", cache=True, utc=True)
+        retried = retried.dt.tz_convert(None)
+        # The retry can come back at a finer unit; match the fast path before combining
+        parsed = parsed.where(~retry, retried.astype(parsed.dtype))
+    return parsed.dt.normalize()
 
 
 # -------------------------
@@ -87,14 +158,107 @@ def bucket_due(due_date, today: pd.Timestamp) -> str:
     return "BEYOND_YEAR_ENDS"
 
 
+BUCKET_ORDER = [
+    "BY_CALENDAR_YEAR_END",
+    "BY_FISCAL_YEAR_END",
+    "BEYOND_YEAR_ENDS",
+    "OVERDUE",
+]
+
+
+def days_until(due: pd.Series, today: pd.Timestamp) -> np.ndarray:
+    """
+    Whole days from today to each due date (negative = overdue).
+    Float so missing dates stay NaN, which compares False in every mask.
+    """
+    # Subtract in the column's own unit (a day-unit today promotes to it):
+    # forcing ns overflows placeholder dates past 2262 like 12/31/9999.
+    today = np.datetime64(pd.Timestamp(today).date(), "D")
+    return (due.to_numpy() - today) / np.timedelta64(1, "D")
+
+
+def bucket_days(days: np.ndarray, today: pd.Timestamp) -> pd.Categorical:
+    """
+    Vectorized bucket_due() over days_until() output.
+    Returns an ordered Categorical over BUCKET_ORDER; missing dates (NO_DATE) become NaN.
+    """
+    today = pd.Timestamp(today).normalize()
+    fy_days = (fiscal_year_end(today) - today).days
+    cal_days = (calendar_year_end(today) - today).days
+    earlier_code = 0 if cal_days <= fy_days else 1
+
+    codes = np.select(
+        [
+            days < 0,
+            days <= min(fy_days, cal_days),
+            days <= fy_days,
+            days <= cal_days,
+            ~np.isnan(days),
+        ],
+        [3, earlier_code, 1, 0, 2],
+        default=-1,
+    ).astype(np.int8)
+    return pd.Categorical.from_codes(codes, categories=BUCKET_ORDER, ordered=True)
+
+
+def suppress_battery_mask(battery_days: np.ndarray, unit_days: np.ndarray) -> np.ndarray:
+    """
+    True where the battery row shouldn't be logged, from days_until() output:
+      - Rule 1: battery due and unit due are within 365 days of each other,
+                so prefer replacing the unit
+      - Rule 2: both are overdue, so only log the unit
+    NaN days fail every comparison, so both rules need both dates present.
+    """
+    prefer_unit_due_to_proximity = np.abs(unit_days - battery_days) <= 365
+    both_overdue = (battery_days < 0) & (unit_days < 0)
+    return prefer_unit_due_to_proximity | both_overdue
+
+
+CSV_WRITE_BUFFER = 1 << 20
+CSV_WRITE_WORKERS = 8
+
+
 def write_bucket_csv(group_df: pd.DataFrame, out_path: Path, cols: list[str]):
-    cols = [c for c in cols if c in group_df.columns]
-    out_path.parent.mkdir(parents=True, exist_ok=True)
-    group_df.loc[:, cols].to_csv(out_path, index=False)
+    # Caller creates out_path.parent and passes only columns present in group_df;
+    # one large buffer means one flush per file
+    with open(out_path, "w", buffering=CSV_WRITE_BUFFER, newline="", encoding="utf-8") as f:
+        group_df.to_csv(f, index=False, columns=cols)
+
+
+OUT_FORMATS = ["csv", "parquet", "feather"]
+
+
+def arrow_safe_frame(group_df: pd.DataFrame, cols: list[str]) -> pd.DataFrame:
+    """
+    Projects to cols for parquet/feather output.
+    Object columns often mix ints and text in Smartsheet exports, which Arrow
+    can't convert, so they become "string". Categoricals do too, so a file
+    doesn't carry the full category dictionary (e.g. every other contact's name).
+    """
+    out = group_df[cols].reset_index(drop=True)
+    for c in out.columns:
+        dtype = out[c].dtype
+        if dtype == object or isinstance(dtype, pd.CategoricalDtype):
+            out[c] = out[c].astype("string")
+    return out
+
+
+def write_bucket(group_df: pd.DataFrame, out_path: Path, cols: list[str], fmt: str = "csv"):
+    # parquet/feather need pyarrow; the file extension is expected to match fmt
+    if fmt == "csv":
+        write_bucket_csv(group_df, out_path, cols)
+    elif fmt == "parquet":
+        arrow_safe_frame(group_df, cols).to_parquet(out_path, index=False)
+    elif fmt == "feather":
+        arrow_safe_frame(group_df, cols).to_feather(out_path)
+    else:
+        raise ValueError(f"Unsupported output format: {fmt}")
 
 
 def not_blank(series: pd.Series) -> pd.Series:
-    return series.notna() & (series.astype(str).str.strip() != "")
+    # Arrow string kernels strip/compare without building a Python str per cell
+    s = series.astype(_STRING_DTYPE)
+    return (s.notna() & s.str.strip().ne("")).astype(bool)
 
 
 def classify_idf_mdf(location_value) -> str:
@@ -117,11 +281,11 @@ def format_counts(title: str, series: pd.Series) -> str:
     return f"{title}:\n{series.to_string()}"
 
 
-def list_overdue_locations(summary_lines: list[str], sub: pd.DataFrame, loc_col: str, title: str):
+def list_overdue_locations(out: TextIO, sub: pd.DataFrame, loc_col: str, title: str):
     if len(sub) == 0:
-        summary_lines.append(f"{title}: None")
+        out.write(f"{title}: None\n")
         return
-    summary_lines.append(f"{title}:")
+    out.write(f"{title}:\n")
     tmp = sub[["closet_type", loc_col]].dropna().sort_values(["closet_type", loc_col])
-    for _, r in tmp.iterrows():
-        summary_lines.append(f"- {r['closet_type']}: {r[loc_col]}")
+    lines = "- " + tmp["closet_type"].astype(str) + ": " + tmp[loc_col].astype(str)
+    out.writelines(line + "\n" for line in lines.tolist())